@@ -1,9 +1,57 @@
 import argparse
+import hashlib
 import os
+import shutil
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 
-import ass
+# Filtered output keyed by content digest; batch runs on episode sets often
+# contain identical scripts, which then skip the filter pass entirely
+_filter_cache = {}
+
+
+def filter_script(data, styles, keep_lines, remove_comments):
+    keep_comments = not remove_comments
+
+    # Scan the raw bytes line by line; the prefixes and separators are
+    # ASCII, so pass-through lines never need a UTF-8 decode and the BOM
+    # rides along on the first line untouched
+    kept = []
+    for line in data.splitlines(keepends=True):
+        is_comment = line.startswith(b"Comment:")
+        if is_comment or line.startswith(b"Dialogue:"):
+            if is_comment and keep_comments:
+                pass
+            elif keep_lines != (line.split(b",", 4)[3].strip() in styles):
+                continue
+        kept.append(line)
+
+    return b"".join(kept)
+
+
+def process_file(file_path, styles, suffix, keep_lines, remove_comments):
+    new_file_path = file_path.with_name(f"{file_path.stem}_{suffix}.ass")
+
+    data = file_path.read_bytes()
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    if digest in _filter_cache:
+        filtered = _filter_cache[digest]
+    else:
+        filtered = filter_script(data, styles, keep_lines, remove_comments)
+        # None marks inputs the filter left untouched
+        if len(filtered) == len(data):
+            filtered = None
+        _filter_cache[digest] = filtered
+
+    if filtered is None:
+        # Nothing was removed, so a plain file copy beats rewriting
+        shutil.copyfile(file_path, new_file_path)
+    else:
+        new_file_path.write_bytes(filtered)
+
+    return new_file_path
 
 
 def main():
@@ -57,41 +105,42 @@ def main():
 
     args = parser.parse_args()
     directory_path = Path(args.directory)
-    styles = args.styles.split(",")
+    # Pre-encode the style names so the filter compares bytes directly
+    styles = frozenset(s.strip().encode("utf-8") for s in args.styles.split(","))
 
     # Check if directory exists
     if not directory_path.exists() or not directory_path.is_dir():
         print(f"Error: Directory '{directory_path}' does not exist or is not a directory.", file=sys.stderr)
         return 1
 
-    for file_path in directory_path.glob("*.ass"):
-        base_name = file_path.stem
-
-        # Skip processing existing files created by the script
-        if base_name.endswith(args.suffix):
-            continue
-
-        # Parse sub file
-        with file_path.open(encoding="utf_8_sig") as orig_subs:
-            doc = ass.parse(orig_subs)
-            
-        # Filtering events based on user input
-        new_events = []
-        for event in doc.events:
-            if args.keep_lines and event.style in styles:
-                new_events.append(event)
-            elif not args.keep_lines and event.style not in styles:
-                new_events.append(event)
-            elif event.TYPE == "Comment" and not args.remove_comments:
-                new_events.append(event)
-        
-        doc.events = new_events
-
-        new_file_path = directory_path / f"{base_name}_{args.suffix}.ass"
-        with new_file_path.open("w", encoding="utf_8_sig") as new_subs:
-            doc.dump_file(new_subs)
-
-        print(f"Created file {new_file_path}")
+    # scandir serves names straight from the readdir buffer without a stat
+    # per entry; files created by the script are skipped before any open
+    with os.scandir(directory_path) as entries:
+        ass_files = [
+            Path(entry.path)
+            for entry in entries
+            if entry.is_file()
+            and entry.name.endswith(".ass")
+            and not entry.name.endswith(f"_{args.suffix}.ass")
+        ]
+
+    # Each file is independent, so spread them across all cores
+    worker = partial(
+        process_file,
+        styles=styles,
+        suffix=args.suffix,
+        keep_lines=args.keep_lines,
+        remove_comments=args.remove_comments,
+    )
+    # A single file is not worth the pool spin-up cost
+    if len(ass_files) <= 1:
+        for new_file_path in map(worker, ass_files):
+            print(f"Created file {new_file_path}")
+        return
+
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for new_file_path in executor.map(worker, ass_files):
+            print(f"Created file {new_file_path}")
 
 
 if __name__ == "__main__":
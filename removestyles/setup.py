@@ -4,7 +4,6 @@ setup(
     name='removestyles',
     version='0.0.3',
     py_modules=['removestyles'],
-    install_requires=['ass>=0.5.1'],
     entry_points={
         "console_scripts": ["removestyles=removestyles:main"]
     }
@@ -1,53 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor
 from subprocess import Popen, PIPE
 import argparse
 import os
 import sys
-import tempfile
 
-from scipy import signal
-from scipy.io import wavfile
+from scipy.fft import rfft, irfft, next_fast_len
+from scipy.signal import resample_poly
 import numpy as np
 
 from pymkv import MKVFile, MKVTrack
 
 
-def find_offset(file1, file2, trim, sample_rate):
+def find_offset(file1, file2, trim, sample_rate, coarse_rate=500, fine_window=30):
     """
     Find the offset between two audio files using cross-correlation.
-    
+
+    Uses a coarse-to-fine search: a first correlation at a low sample rate
+    locates the peak cheaply, then a short correlation at the full sample
+    rate refines it within +/-1 second of the coarse estimate.
+
     Parameters:
     - file1, file2: Paths to the two audio files to be compared.
     - trim: Duration for trimming the audio.
     - sample_rate: Sample rate to be used for the audio files.
-    
+    - coarse_rate: Sample rate for the coarse correlation pass.
+    - fine_window: Length in seconds of the slices used for refinement.
+
     Returns:
     - delay: Offset in milliseconds between the two audio files.
     """
-    
-    tmp1 = convert_and_trim(file1, sample_rate, trim)
-    tmp2 = convert_and_trim(file2, sample_rate, trim)
-    
-    aud1 = wavfile.read(tmp1, mmap=True)[1] / (2.0 ** 15)
-    aud2 = wavfile.read(tmp2, mmap=True)[1] / (2.0 ** 15)
-    
-    n = len(aud1)
-    correlation = signal.correlate(aud1, aud2, mode="same")
-    corr_normalization = correlation[int(n / 2)] * correlation[int(n / 2)]
-    
-    corr = correlation / np.sqrt(corr_normalization)
-    
-    delay_arr = np.linspace(-0.5 * n / sample_rate, 0.5 * n / sample_rate, n)
-    delay = int(delay_arr[np.argmax(corr)] * 1000)
 
-    os.remove(tmp1)
-    os.remove(tmp2)
+    # Scale int16 to float32 in a single fused pass; float64 would double
+    # the bytes moved through the FFTs for no accuracy gain at these
+    # signal lengths
+    scale = np.float32(1.0 / 32768.0)
+
+    if file1 == file2 and os.name == "posix":
+        # Same container on both sides means syncing its first two audio
+        # tracks; demux it once instead of spawning ffmpeg twice
+        raw1, raw2 = convert_and_trim_pair(file1, sample_rate, trim)
+        aud1 = np.multiply(raw1, scale, dtype=np.float32)
+        aud2 = np.multiply(raw2, scale, dtype=np.float32)
+    else:
+        # Decode both inputs at the same time; each call blocks on ffmpeg
+        # I/O, so two threads let the processes run side by side
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            decode1 = executor.submit(convert_and_trim, file1, sample_rate, trim)
+            decode2 = executor.submit(convert_and_trim, file2, sample_rate, trim)
+            aud1 = np.multiply(decode1.result(), scale, dtype=np.float32)
+            aud2 = np.multiply(decode2.result(), scale, dtype=np.float32)
+
+    n = min(len(aud1), len(aud2))
+    aud1 = aud1[:n]
+    aud2 = aud2[:n]
+
+    # Coarse pass: locate the peak at a fraction of the sample rate
+    coarse1 = resample_poly(aud1, coarse_rate, sample_rate)
+    coarse2 = resample_poly(aud2, coarse_rate, sample_rate)
+    coarse_n = min(len(coarse1), len(coarse2))
+    coarse_corr = correlate_audio(coarse1[:coarse_n], coarse2[:coarse_n])
+    coarse_lag = int(np.argmax(coarse_corr)) - coarse_n // 2
+    lag = int(round(coarse_lag * sample_rate / coarse_rate))
+
+    # Fine pass: correlate short slices aligned on the coarse estimate
+    seg1 = aud1[lag:] if lag >= 0 else aud1
+    seg2 = aud2 if lag >= 0 else aud2[-lag:]
+    w = min(len(seg1), len(seg2), fine_window * sample_rate)
+
+    # No normalization: dividing by a positive scalar cannot move the argmax
+    correlation = correlate_audio(seg1[:w], seg2[:w])
+
+    # Only search within +/-1 second of the coarse peak
+    lo = max(w // 2 - sample_rate, 0)
+    hi = min(w // 2 + sample_rate + 1, w)
+    peak = lo + int(np.argmax(correlation[lo:hi]))
+    delay = int(round((lag + peak - w // 2) * 1000 / sample_rate))
 
     return delay
 
 
+def correlate_audio(aud1, aud2):
+    """
+    Cross-correlate two equal-length signals using real FFTs.
+
+    Parameters:
+    - aud1, aud2: 1-D arrays of the same length.
+
+    Returns:
+    - correlation: Cross-correlation of the two signals, laid out the same
+      way as scipy.signal.correlate(aud1, aud2, mode="same").
+    """
+
+    n = len(aud1)
+    length = next_fast_len(2 * n - 1)
+
+    f1 = rfft(aud1, length, workers=-1)
+    f2 = rfft(aud2, length, workers=-1)
+
+    # PHAT weighting: discard magnitude and keep only phase, which sharpens
+    # the peak and resists correlated background noise
+    spectrum = f1 * np.conj(f2)
+    spectrum /= np.abs(spectrum) + 1e-12
+    correlation = irfft(spectrum, length, workers=-1)
+
+    # Reorder the circular lags so that lag 0 lands at index n // 2
+    return np.concatenate((correlation[length - n // 2:], correlation[:n - n // 2]))
+
+
 def convert_and_trim(audio_file, sample_rate, trim_duration):
     """
-    Convert an audio file to a specified sample rate and trim its duration.
+    Decode an audio file to mono samples at a specified sample rate.
 
     Parameters:
     - audio_file: Path to the input audio file.
@@ -55,31 +117,78 @@ def convert_and_trim(audio_file, sample_rate, trim_duration):
     - trim_duration: Duration to which the audio should be trimmed.
 
     Returns:
-    - tmp_name: Path to the converted and trimmed temporary WAV file.
+    - samples: 1-D numpy int16 array with the decoded samples.
     """
-    
-    with tempfile.NamedTemporaryFile(mode="r+b", prefix="offset_", suffix=".wav", delete=False) as tmp:
-        tmp_name = tmp.name
-
-        ffmpeg_cmd = [
-            "ffmpeg",
-            "-loglevel", "panic",
-            "-i", audio_file,
-            "-ac", "1",
-            "-ar", str(sample_rate),
-            "-ss", "0",
-            "-t", str(trim_duration),
-            "-acodec", "pcm_s16le",
-            tmp_name
-        ]
-
-        process = Popen(ffmpeg_cmd, stderr=PIPE)
-        _, stderr = process.communicate()
-
-        if process.returncode != 0:
-            raise Exception(f"FFMpeg failed with error: {stderr.decode('utf-8')}")
-
-    return tmp_name
+
+    ffmpeg_cmd = [
+        "ffmpeg",
+        "-loglevel", "panic",
+        "-i", audio_file,
+        "-ac", "1",
+        "-ar", str(sample_rate),
+        "-ss", "0",
+        "-t", str(trim_duration),
+        "-f", "s16le",
+        "-"
+    ]
+
+    process = Popen(ffmpeg_cmd, stdout=PIPE, stderr=PIPE)
+    data, stderr = process.communicate()
+
+    if process.returncode != 0:
+        raise Exception(f"FFMpeg failed with error: {stderr.decode('utf-8')}")
+
+    return np.frombuffer(data, dtype=np.int16)
+
+
+def convert_and_trim_pair(audio_file, sample_rate, trim_duration):
+    """
+    Decode the first two audio tracks of one container in a single pass.
+
+    Parameters:
+    - audio_file: Path to the container holding both audio tracks.
+    - sample_rate: Desired sample rate for the output.
+    - trim_duration: Duration to which the audio should be trimmed.
+
+    Returns:
+    - samples1, samples2: 1-D numpy int16 arrays, one per track.
+    """
+
+    read_fd, write_fd = os.pipe()
+
+    track_args = [
+        "-ac", "1",
+        "-ar", str(sample_rate),
+        "-ss", "0",
+        "-t", str(trim_duration),
+        "-f", "s16le",
+    ]
+    ffmpeg_cmd = [
+        "ffmpeg",
+        "-loglevel", "panic",
+        "-i", audio_file,
+        "-map", "0:a:0", *track_args, "-",
+        "-map", "0:a:1", *track_args, f"pipe:{write_fd}",
+    ]
+
+    process = Popen(ffmpeg_cmd, stdout=PIPE, stderr=PIPE, pass_fds=(write_fd,))
+    os.close(write_fd)
+
+    # Drain the extra pipe on a thread while communicate() reads stdout,
+    # otherwise ffmpeg blocks as soon as one of the two buffers fills
+    def read_side():
+        with os.fdopen(read_fd, "rb") as side:
+            return side.read()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        side_read = executor.submit(read_side)
+        data1, stderr = process.communicate()
+        data2 = side_read.result()
+
+    if process.returncode != 0:
+        raise Exception(f"FFMpeg failed with error: {stderr.decode('utf-8')}")
+
+    return np.frombuffer(data1, dtype=np.int16), np.frombuffer(data2, dtype=np.int16)
 
 
 def mux_file(file_path, offset):